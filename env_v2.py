@@ -3,9 +3,13 @@
 # anything you like. In our implementation we pass in a Value object which holds a type
 # and a value (e.g., Int, 10).
 class EnvironmentManager:
-  def __init__(self):
-    self.layers = [{}]
-    self.num_layers = 0
+  def __init__(self, captured = None):
+    if captured is None:
+      self.layers = [{}]
+      self.num_layers = 0
+    else: #lambda call: captured variables sit in a layer below the lambda's own scope
+      self.layers = [dict(captured), {}]
+      self.num_layers = 1
     #we assume that all references are on the top level func scope
 
   # Gets the data associated a variable name
@@ -11,11 +11,34 @@ class FuncInfo:
     self.args = args  # name, type
     self.refs = refs
 
+# LambdaInfo also tracks where the lambda's body ends and the free variables of its body.
+# It is computed once per lambda definition and shared by every closure created from it.
+class LambdaInfo(FuncInfo):
+  def __init__(self, start_ip, args, return_type, refs, end_ip, free_vars):
+    super().__init__(start_ip, args, return_type, refs)
+    self.end_ip = end_ip          # line number of the endlambda
+    self.free_vars = free_vars    # names used in the body that may come from the enclosing scope
+
+# Closure is the value held by a func variable: the function to call and, for a lambda,
+# the values of its free variables at the time the lambda was created
+class Closure:
+  def __init__(self, func_info, captured = None):
+    self.func_info = func_info
+    self.captured = captured
+
 # FunctionManager keeps track of every function in the program, mapping the function name
 # to a FuncInfo object (which has the starting line number/instruction pointer) of that function.
 class FunctionManager:
+  # names that can appear after the first token of a line but are never variables
+  KEYWORDS = {InterpreterBase.INT_DEF, InterpreterBase.BOOL_DEF, InterpreterBase.STRING_DEF,
+              InterpreterBase.FUNC_DEF, InterpreterBase.VOID_DEF, InterpreterBase.TRUE_DEF,
+              InterpreterBase.FALSE_DEF, InterpreterBase.PRINT_DEF, InterpreterBase.INPUT_DEF,
+              InterpreterBase.STRTOINT_DEF}
+
   def __init__(self, tokenized_program):
     self.func_cache = {}
+    self.func_lines = {}  # line number of each func def -> (func name, FuncInfo)
+    self.lambda_cache = {}  # line number of each lambda def -> LambdaInfo, filled on first use
     self._cache_function_line_numbers(tokenized_program)
 
   def get_function_info(self, func_name):
@@ -23,22 +46,99 @@ class FunctionManager:
       return None
     return self.func_cache[func_name]
 
-  def _cache_function_line_numbers(self, tokenized_program):
-    for line_num, line in enumerate(tokenized_program):
+  # returns the LambdaInfo for the lambda defined on line_num, or None if it has no endlambda
+  def get_lambda_info(self, line_num, tokenized_program, indents):
+    lambda_info = self.lambda_cache.get(line_num)
+    if lambda_info is None:
+      lambda_info = self._analyze_lambda(line_num, tokenized_program, indents)
+      self.lambda_cache[line_num] = lambda_info
+    return lambda_info
+
+  # finds the functions defined in tokenized_lines, whose first line is line first_line,
+  # returning a map from line number to (func name, FuncInfo)
+  def parse_functions(self, first_line, tokenized_lines):
+    functions = {}
+    for line_num, line in enumerate(tokenized_lines, first_line):
       if line and line[0] == InterpreterBase.FUNC_DEF:
         func_name = line[1]
         return_type = line[-1]
-        args = []
-        refs = []
-        for a in line[2:-1]:
-          #assumes that we only get valid types
-          name, type = a.split(":")
-          if type[0] == 'r':
-            args.append((name, type[3:]))
-            refs.append(True)
-          else:
-            args.append((name, type))
-            refs.append(False)
+        args, refs = self._parse_args(line[2:-1])
         func_info = FuncInfo(line_num + 1, args, return_type, refs)   # function starts executing on line after funcdef
-        self.func_cache[func_name] = func_info
+        functions[line_num] = (func_name, func_info)
+    return functions
+
+  # patches the function table after lines[start:end] were replaced by num_lines lines defining
+  # new_functions (from parse_functions), shifting the functions below the edit instead of
+  # rescanning the whole program
+  def apply_edit(self, start, end, num_lines, new_functions):
+    delta = num_lines - (end - start)
+    func_lines = {}
+    for line_num, (func_name, func_info) in self.func_lines.items():
+      if line_num < start:
+        func_lines[line_num] = (func_name, func_info)
+      elif line_num >= end:
+        func_info.start_ip += delta
+        func_lines[line_num + delta] = (func_name, func_info)
+    func_lines.update(new_functions)
+    self.func_lines = func_lines
+    self._shift_lambdas(start, end, delta)
+    self._rebuild_cache()
 
+  # keeps the lambdas that end above the edit, shifts the ones below it and drops the ones
+  # the edit touches so they are re-analyzed on next use
+  def _shift_lambdas(self, start, end, delta):
+    lambda_cache = {}
+    for line_num, lambda_info in self.lambda_cache.items():
+      if lambda_info is None:
+        continue
+      if lambda_info.end_ip < start:
+        lambda_cache[line_num] = lambda_info
+      elif line_num >= end:
+        lambda_info.start_ip += delta
+        lambda_info.end_ip += delta
+        lambda_cache[line_num + delta] = lambda_info
+    self.lambda_cache = lambda_cache
+
+  def _cache_function_line_numbers(self, tokenized_program):
+    self.func_lines = self.parse_functions(0, tokenized_program)
+    self._rebuild_cache()
+
+  def _parse_args(self, arg_tokens):
+    args = []
+    refs = []
+    for a in arg_tokens:
+      #assumes that we only get valid types
+      name, type = a.split(":")
+      if type[0] == 'r':
+        args.append((name, type[3:]))
+        refs.append(True)
+      else:
+        args.append((name, type))
+        refs.append(False)
+    return args, refs
+
+  # finds the end of a lambda's body and every name its body (including nested lambdas) uses
+  # other than its own parameters. Only those names are captured when the lambda is created.
+  def _analyze_lambda(self, line_num, tokenized_program, indents):
+    line = tokenized_program[line_num]
+    return_type = line[-1]
+    args, refs = self._parse_args(line[1:-1])
+    params = [name for name, _ in args]
+    free_vars = {}
+    for end_ip in range(line_num + 1, len(tokenized_program)):
+      tokens = tokenized_program[end_ip]
+      if not tokens:
+        continue
+      if tokens[0] == InterpreterBase.ENDLAMBDA_DEF and indents[end_ip] == indents[line_num]:
+        return LambdaInfo(line_num + 1, args, return_type, refs, end_ip, tuple(free_vars))
+      for token in tokens[1:]:  # first token is always a keyword
+        if token.isidentifier() and token not in FunctionManager.KEYWORDS and token not in params:
+          free_vars[token] = None
+    return None
+
+  # if a function is defined more than once, the last definition wins
+  def _rebuild_cache(self):
+    self.func_cache = {}
+    for line_num in sorted(self.func_lines):
+      func_name, func_info = self.func_lines[line_num]
+      self.func_cache[func_name] = func_info
@@ -5,6 +5,7 @@ class ErrorType(Enum):
   TYPE_ERROR = 1
   NAME_ERROR = 2    # if a variable or function name can't be found
   SYNTAX_ERROR = 3  # used for syntax errors
+  RESOURCE_ERROR = 4  # if a program exceeds a limit set by whoever runs it
   # Add others here
 
 
@@ -99,12 +100,22 @@ class InterpreterBase:
     return self.error_type, self.error_line
 
   def validate_program(self, program):
-   first_tokens = [tokens[0] if tokens else '' for tokens in
-                   [line.split(InterpreterBase.COMMENT_DEF)[0].split() for line in program]]
-   indents = [len(line) - len(line.lstrip(' ')) for line in program]
+   first_tokens = [InterpreterBase.first_token(line) for line in program]
+   indents = [InterpreterBase.indentation(line) for line in program]
+   self.validate_structure(first_tokens, indents)
+
+  # validates block structure given the first token and indentation of every line
+  def validate_structure(self, first_tokens, indents):
    self.__validate_blocks(first_tokens,indents)
    self.__validate_indentation(first_tokens,indents)
 
+  def first_token(line):
+   tokens = line.split(InterpreterBase.COMMENT_DEF)[0].split()
+   return tokens[0] if tokens else ''
+
+  def indentation(line):
+   return len(line) - len(line.lstrip(' '))
+
   def __validate_blocks(self, first_tokens, indents):
     stack = []
     for i in range(0,len(first_tokens)):
@@ -120,9 +131,13 @@ class InterpreterBase:
       if first_tokens[i] == InterpreterBase.WHILE_DEF:
         stack.append((i, InterpreterBase.ENDWHILE_DEF, indents[i]))
         continue
+      if first_tokens[i] == InterpreterBase.LAMBDA_DEF:
+        stack.append((i, InterpreterBase.ENDLAMBDA_DEF, indents[i]))
+        continue
 
       if first_tokens[i] in [InterpreterBase.ENDFUNC_DEF, InterpreterBase.ENDIF_DEF,
-                             InterpreterBase.ELSE_DEF, InterpreterBase.ENDWHILE_DEF]:
+                             InterpreterBase.ELSE_DEF, InterpreterBase.ENDWHILE_DEF,
+                             InterpreterBase.ENDLAMBDA_DEF]:
         if not stack:
           self.error(ErrorType.SYNTAX_ERROR,f'Mismatched {first_tokens[i]} on line {i}', i)
         top_item = stack.pop()
@@ -142,12 +157,14 @@ class InterpreterBase:
       if not first_tokens[i]:
         continue
 
-      if first_tokens[i] in [InterpreterBase.FUNC_DEF,InterpreterBase.IF_DEF,InterpreterBase.WHILE_DEF]:
+      if first_tokens[i] in [InterpreterBase.FUNC_DEF,InterpreterBase.IF_DEF,InterpreterBase.WHILE_DEF,
+                             InterpreterBase.LAMBDA_DEF]:
         if stack and indents[i] <= stack[-1]:
           break
         stack.append(indents[i])
       elif first_tokens[i] in [InterpreterBase.ENDFUNC_DEF, InterpreterBase.ENDIF_DEF,
-                               InterpreterBase.ELSE_DEF, InterpreterBase.ENDWHILE_DEF]:
+                               InterpreterBase.ELSE_DEF, InterpreterBase.ENDWHILE_DEF,
+                               InterpreterBase.ENDLAMBDA_DEF]:
         if indents[i] != stack[-1]:
           break
         if first_tokens[i] != InterpreterBase.ELSE_DEF:
@@ -1,14 +1,17 @@
+import sys
 from enum import Enum
 from intbase import InterpreterBase, ErrorType
 from env_v2 import EnvironmentManager
-from tokenize import Tokenizer
-from func_v2 import FunctionManager
+from func_v2 import Closure
+from program_v2 import Program
+from quota_v2 import Quotas, QuotaError
 
 # Enumerated type for our different language data types
 class Type(Enum):
   INT = 1
   BOOL = 2
   STRING = 3
+  FUNC = 4
 
 # Represents a value, which has a type and its value
 class Value:
@@ -26,29 +29,51 @@ class Value:
   def type(self):
     return self.t
 
+# size of a string in utf-8, without encoding it when it is plain ascii
+def _utf8_len(s):
+  return len(s) if s.isascii() else len(s.encode())
+
 # Main interpreter class
 class Interpreter(InterpreterBase):
-  def __init__(self, console_output=True, input=None, trace_output=False):
+  def __init__(self, console_output=True, input=None, trace_output=False, quotas=None, journal=None):
     super().__init__(console_output, input)
     self._setup_operations()  # setup all valid binary operations and the types they work on
     self.trace_output = trace_output
+    self.quotas = quotas or Quotas()  # resource limits, unlimited by default
+    self.journal = journal  # Recorder or Replayer from replay_v2, None when not recording
 
-  # run a program, provided in an array of strings, one string per line of source code
+  # run a program, provided in an array of strings, one string per line of source code,
+  # or as an already analyzed Program
   def run(self, program):
-    self.program = program
-    self._compute_indentation(program)  # determine indentation of every line
-    self.tokenized_program = Tokenizer.tokenize_program(program)
-    self.func_manager = FunctionManager(self.tokenized_program)
+    if not isinstance(program, Program):
+      program = Program(program)
+    self.program = program.lines
+    self.indents = program.indents  # indentation of every line
+    self.tokenized_program = program.tokenized_program
+    self.func_manager = program.func_manager
     self.env_stack = []
     self.result_stack = []
-    self.ip = self._find_first_instruction(InterpreterBase.MAIN_FUNC)
-    self.return_stack = []
-    self.terminate = False
-    #self.global_env = EnvironmentManager() # used to track variables/scope
-
-    # main interpreter run loop
-    while not self.terminate:
-      self._process_line()
+    self.ip = None  # errors before main starts have no line
+    self.steps = 0  # lines executed up to the start of the current basic block
+    self.output_bytes = 0
+    self.string_bytes = 0  # bytes of every string built by + or read by input
+    self.next_checkpoint = self.journal.checkpoint_interval if self.journal else None
+    self._set_next_step_check()
+    if self.journal:
+      self.journal.start(self.program)
+    try:
+      self.ip = self._find_first_instruction(InterpreterBase.MAIN_FUNC)
+      self.block_start = self.ip
+      self.return_stack = []
+      self.terminate = False
+      #self.global_env = EnvironmentManager() # used to track variables/scope
+
+      # main interpreter run loop
+      while not self.terminate:
+        self._process_line()
+    finally:
+      if self.journal:
+        self.journal.finish()
 
   def _process_line(self):
     if self.trace_output:
@@ -83,6 +108,10 @@ class Interpreter(InterpreterBase):
         self._while(args)
       case InterpreterBase.ENDWHILE_DEF:
         self._endwhile(args)
+      case InterpreterBase.LAMBDA_DEF:
+        self._lambda(args)
+      case InterpreterBase.ENDLAMBDA_DEF:
+        self._return(False)
       case default:
         raise Exception(f'Unknown command: {tokens[0]}')
 
@@ -101,6 +130,8 @@ class Interpreter(InterpreterBase):
           self.env_stack[-1].new_var(a,Value(Type.BOOL, False))
         case InterpreterBase.STRING_DEF:
           self.env_stack[-1].new_var(a,Value(Type.STRING, ""))
+        case InterpreterBase.FUNC_DEF:
+          self.env_stack[-1].new_var(a,Value(Type.FUNC, None))
         case _:
           raise Exception(f'Unknown type: {type}')
 
@@ -131,15 +162,16 @@ class Interpreter(InterpreterBase):
     else:
       self.return_stack.append(self.ip+1)
       if len(args) > 1:
-        self.ip = self._find_first_instruction(args[0], args[1:])
+        self._jump(self._find_first_instruction(args[0], args[1:]))
       else:
-        self.ip = self._find_first_instruction(args[0])
+        self._jump(self._find_first_instruction(args[0]))
 
   def _endfunc(self):
     if not self.return_stack:  # done with main!
+      self._end_block()
       self.terminate = True
     else:
-      self.ip = self.return_stack.pop()
+      self._jump(self.return_stack.pop())
 
   def _if(self, args):
     if not args:
@@ -147,6 +179,8 @@ class Interpreter(InterpreterBase):
     value_type = self._eval_expression(args)
     if value_type.type() != Type.BOOL:
       super().error(ErrorType.TYPE_ERROR,f"Non-boolean if expression", self.ip) #!
+    if self.journal:
+      self.journal.branch(value_type.value())
     # create new env layer
     self.env_stack[-1].new_layer()
     if value_type.value():
@@ -160,7 +194,7 @@ class Interpreter(InterpreterBase):
         if (tokens[0] == InterpreterBase.ENDIF_DEF or tokens[0] == InterpreterBase.ELSE_DEF) and self.indents[self.ip] == self.indents[line_num]:
           if tokens[0] == InterpreterBase.ENDIF_DEF:
             self.env_stack[-1].kill_layer()
-          self.ip = line_num + 1
+          self._jump(line_num + 1)
           return
     super().error(ErrorType.SYNTAX_ERROR,f"Missing endif", self.ip) #no
 
@@ -175,7 +209,7 @@ class Interpreter(InterpreterBase):
       if not tokens:
         continue
       if tokens[0] == InterpreterBase.ENDIF_DEF and self.indents[self.ip] == self.indents[line_num]:
-          self.ip = line_num + 1
+          self._jump(line_num + 1)
           return
     super().error(ErrorType.SYNTAX_ERROR,f"Missing endif", self.ip) #no
 
@@ -204,6 +238,8 @@ class Interpreter(InterpreterBase):
         res = 'resultb'
       case InterpreterBase.STRING_DEF:
         res = 'results'
+      case InterpreterBase.FUNC_DEF:
+        res = 'resultf'
       case InterpreterBase.VOID_DEF:        #error if we have any arguments for a void func
         super().error(ErrorType.TYPE_ERROR,f"Invalid return type", self.ip)
     #default assignment (can reset result variable if it was something else)
@@ -222,6 +258,8 @@ class Interpreter(InterpreterBase):
         self.env_stack[-1].new_base("resultb", Value(Type.BOOL, False))
       case InterpreterBase.STRING_DEF:
         self.env_stack[-1].new_base("results", Value(Type.STRING, ""))
+      case InterpreterBase.FUNC_DEF:
+        self.env_stack[-1].new_base("resultf", Value(Type.FUNC, None))
       case _:
         raise Exception(f'Unknown type: {type}')
 
@@ -231,6 +269,8 @@ class Interpreter(InterpreterBase):
     value_type = self._eval_expression(args)
     if value_type.type() != Type.BOOL:
       super().error(ErrorType.TYPE_ERROR,f"Non-boolean while expression", self.ip) #!
+    if self.journal:
+      self.journal.branch(value_type.value())
     if value_type.value() == False:
       self._exit_while()
       return
@@ -246,7 +286,7 @@ class Interpreter(InterpreterBase):
         cur_line += 1 
         continue
       if self.tokenized_program[cur_line][0] == InterpreterBase.ENDWHILE_DEF and self.indents[cur_line] == while_indent:
-        self.ip = cur_line + 1
+        self._jump(cur_line + 1)
         return
       if self.tokenized_program[cur_line] and self.indents[cur_line] < self.indents[self.ip]:
         break # syntax error!
@@ -254,6 +294,23 @@ class Interpreter(InterpreterBase):
     # didn't find endwhile
     super().error(ErrorType.SYNTAX_ERROR,f"Missing endwhile", self.ip) #no
 
+  # creates a closure capturing only the free variables of the lambda's body, stores it in
+  # resultf and skips over the body
+  def _lambda(self, args):
+    lambda_info = self.func_manager.get_lambda_info(self.ip, self.tokenized_program, self.indents)
+    if lambda_info is None:
+      super().error(ErrorType.SYNTAX_ERROR,f"Missing endlambda", self.ip) #no
+    env = self.env_stack[-1]
+    captured = {}
+    for name in lambda_info.free_vars:
+      value = env.get(name)
+      if value is not None:
+        captured[name] = value
+    if not env.has_var('resultf'):
+      self._default_assignment(InterpreterBase.FUNC_DEF)
+    self._set_value('resultf', Value(Type.FUNC, Closure(lambda_info, captured)))
+    self._jump(lambda_info.end_ip + 1)
+
   def _endwhile(self, args):
     self.env_stack[-1].kill_layer()
     while_indent = self.indents[self.ip]
@@ -263,7 +320,7 @@ class Interpreter(InterpreterBase):
         cur_line -= 1 
         continue
       if self.tokenized_program[cur_line][0] == InterpreterBase.WHILE_DEF and self.indents[cur_line] == while_indent:
-        self.ip = cur_line
+        self._jump(cur_line)
         return
       if self.tokenized_program[cur_line] and self.indents[cur_line] < self.indents[self.ip]:
         break # syntax error!
@@ -277,17 +334,32 @@ class Interpreter(InterpreterBase):
     out = []
     for arg in args:
       val_type = self._get_value(arg)
+      if val_type.type() == Type.FUNC:
+        super().error(ErrorType.TYPE_ERROR,f"Cannot print a func value", self.ip)
       out.append(str(val_type.value()))
-    super().output(''.join(out))
+    line = ''.join(out)
+    max_output_bytes = self.quotas.max_output_bytes
+    if max_output_bytes is not None:
+      self.output_bytes += _utf8_len(line) + 1
+      if self.output_bytes > max_output_bytes:
+        self._quota_exceeded('max_output_bytes', f"Exceeded limit of {max_output_bytes} bytes of output")
+    super().output(line)
 
   def _input(self, args):
     if args:
       self._print(args)
-    result = super().get_input()
+    result = self.get_input()
+    if result is not None:
+      self._charge_string_bytes(_utf8_len(result))
     if not self.env_stack[-1].has_var('results'):
       self._default_assignment(InterpreterBase.STRING_DEF)
     self._set_value('results', Value(Type.STRING, result))   # return always passed back in results
 
+  def get_input(self):
+    if self.journal:
+      return self.journal.read_input(super().get_input)
+    return super().get_input()
+
   def _strtoint(self, args):
     if len(args) != 1:
       super().error(ErrorType.SYNTAX_ERROR,f"Invalid strtoint call syntax", self.ip) #no
@@ -298,6 +370,42 @@ class Interpreter(InterpreterBase):
       self._default_assignment(InterpreterBase.INT_DEF)
     self._set_value('resulti', Value(Type.INT, int(value_type.value())))   # return always passed back in result
 
+  # moves control to another line. The lines run since the last jump form a basic block and are
+  # charged to the step count together, which keeps quota checks out of the per-line loop.
+  def _jump(self, target):
+    self._end_block()
+    self.ip = target
+    self.block_start = target
+
+  def _end_block(self):
+    self.steps += self.ip - self.block_start + 1
+    if self.steps >= self.next_step_check:
+      self._step_check()
+
+  # slow path of _end_block, taken only once the step count reaches the next threshold
+  def _step_check(self):
+    max_steps = self.quotas.max_steps
+    if max_steps is not None and self.steps > max_steps:
+      self._quota_exceeded('max_steps', f"Exceeded limit of {max_steps} steps")
+    if self.next_checkpoint is not None and self.steps >= self.next_checkpoint:
+      self.journal.checkpoint(self.steps, self.ip)
+      interval = self.journal.checkpoint_interval
+      self.next_checkpoint = (self.steps // interval + 1) * interval
+    self._set_next_step_check()
+
+  def _set_next_step_check(self):
+    thresholds = [sys.maxsize]
+    if self.quotas.max_steps is not None:
+      thresholds.append(self.quotas.max_steps + 1)
+    if self.next_checkpoint is not None:
+      thresholds.append(self.next_checkpoint)
+    self.next_step_check = min(thresholds)
+
+  def _quota_exceeded(self, quota, description):
+    self.error_type = ErrorType.RESOURCE_ERROR
+    self.error_line = self.ip
+    raise QuotaError(f'{ErrorType.RESOURCE_ERROR} on line {self.ip}: {description}', quota, self.ip)
+
   def _advance_to_next_statement(self):
     # for now just increment IP, but later deal with loops, returns, end of functions, etc.
     self.ip += 1
@@ -320,7 +428,7 @@ class Interpreter(InterpreterBase):
      '<=': lambda a,b: Value(Type.BOOL, a.value()<=b.value()),
     }
     self.binary_ops[Type.STRING] = {
-     '+': lambda a,b: Value(Type.STRING, a.value()+b.value()),
+     '+': self._concat,
      '==': lambda a,b: Value(Type.BOOL, a.value()==b.value()),
      '!=': lambda a,b: Value(Type.BOOL, a.value()!=b.value()),
      '>': lambda a,b: Value(Type.BOOL, a.value()>b.value()),
@@ -328,6 +436,7 @@ class Interpreter(InterpreterBase):
      '>=': lambda a,b: Value(Type.BOOL, a.value()>=b.value()),
      '<=': lambda a,b: Value(Type.BOOL, a.value()<=b.value()),
     }
+    self.binary_ops[Type.FUNC] = {}
     self.binary_ops[Type.BOOL] = {
      '&': lambda a,b: Value(Type.BOOL, a.value() and b.value()),
      '==': lambda a,b: Value(Type.BOOL, a.value()==b.value()),
@@ -335,19 +444,35 @@ class Interpreter(InterpreterBase):
      '|': lambda a,b: Value(Type.BOOL, a.value() or b.value())
     }
 
-  def _compute_indentation(self, program):
-    self.indents = [len(line) - len(line.lstrip(' ')) for line in program]
+  def _concat(self, a, b):
+    if self.quotas.max_string_bytes is not None:
+      self._charge_string_bytes(_utf8_len(a.value()) + _utf8_len(b.value()))
+    return Value(Type.STRING, a.value()+b.value())
+
+  def _charge_string_bytes(self, size):
+    self.string_bytes += size
+    max_string_bytes = self.quotas.max_string_bytes
+    if max_string_bytes is not None and self.string_bytes > max_string_bytes:
+      self._quota_exceeded('max_string_bytes', f"Exceeded limit of {max_string_bytes} bytes of strings")
 
   def _find_first_instruction(self, funcname, args = None):
     func_info = self.func_manager.get_function_info(funcname)
+    captured = None
     if func_info == None:
-      super().error(ErrorType.NAME_ERROR,f"Unable to locate {funcname} function", self.ip) #!
+      closure = self._get_closure(funcname)
+      func_info = closure.func_info
+      captured = closure.captured
     arg_vals = []
     if args != None:
       for a in args:
         arg_vals.append(self._get_value(a))
+    max_call_depth = self.quotas.max_call_depth
+    if max_call_depth is not None and len(self.env_stack) >= max_call_depth:
+      self._quota_exceeded('max_call_depth', f"Exceeded limit of {max_call_depth} nested calls")
+    if self.journal:
+      self.journal.call(func_info.start_ip)
     ref_env = self.env_stack[-1] if self.env_stack != [] else None
-    self.env_stack.append(EnvironmentManager())
+    self.env_stack.append(EnvironmentManager(captured))
     self.result_stack.append(func_info.return_type)
     if args != None:
       for i, a in enumerate(arg_vals):
@@ -362,6 +487,8 @@ class Interpreter(InterpreterBase):
                 type = Type.BOOL
               case InterpreterBase.STRING_DEF:
                 type = Type.STRING
+              case InterpreterBase.FUNC_DEF:
+                type = Type.FUNC
               case _:
                 raise Exception(f'Unknown type: {type}')
             if a.type() != type:
@@ -376,6 +503,8 @@ class Interpreter(InterpreterBase):
             type = Type.BOOL
           case InterpreterBase.STRING_DEF:
             type = Type.STRING
+          case InterpreterBase.FUNC_DEF:
+            type = Type.FUNC
           case _:
             raise Exception(f'Unknown type: {type}')
         if a.type() != type:
@@ -384,6 +513,17 @@ class Interpreter(InterpreterBase):
     #gotta handle passing in vars here
     return func_info.start_ip
 
+  # looks up a func variable to call
+  def _get_closure(self, varname):
+    if not self.env_stack or self.env_stack[-1].has_var(varname) == False:
+      super().error(ErrorType.NAME_ERROR,f"Unable to locate {varname} function", self.ip) #!
+    value = self.env_stack[-1].get(varname)
+    if value.type() != Type.FUNC:
+      super().error(ErrorType.TYPE_ERROR,f"Cannot call non-function variable {varname}", self.ip)
+    if value.value() is None:
+      super().error(ErrorType.NAME_ERROR,f"Function variable {varname} was never assigned", self.ip)
+    return value.value()
+
   # given a token name (e.g., x, 17, True, "foo"), give us a Value object associated with it
   def _get_value(self, token):
     if not token:
@@ -395,6 +535,9 @@ class Interpreter(InterpreterBase):
     if token == InterpreterBase.TRUE_DEF or token == InterpreterBase.FALSE_DEF:
       return Value(Type.BOOL, token == InterpreterBase.TRUE_DEF)
     if self.env_stack[-1].has_var(token) == False:
+      func_info = self.func_manager.get_function_info(token)
+      if func_info != None:  # function name used as a value
+        return Value(Type.FUNC, Closure(func_info))
       super().error(ErrorType.NAME_ERROR,f"Cannot reference variable without defining it", self.ip)
     value = self.env_stack[-1].get(token)
     if value  == None:
@@ -0,0 +1,54 @@
+from intbase import InterpreterBase
+from tokenize import Tokenizer
+from func_v2 import FunctionManager
+
+# Program holds the front-end analysis of a brewin program: its source lines, the indentation
+# and first token of every line, the tokenized program and the function table.
+# An Interpreter can run a Program directly, and apply_edits() lets a caller change a few lines
+# and re-analyze only those lines, e.g.:
+#   prog = Program(lines)
+#   interpreter.run(prog)
+#   prog.apply_edits([(3, 4, ["  assign x 10"])])   # replace line 3
+#   interpreter.run(prog)
+class Program:
+  def __init__(self, program):
+    self.lines = list(program)
+    self.indents = [InterpreterBase.indentation(line) for line in self.lines]
+    self.first_tokens = [InterpreterBase.first_token(line) for line in self.lines]
+    self.tokenized_program = Tokenizer.tokenize_program(self.lines)
+    self.func_manager = FunctionManager(self.tokenized_program)
+
+  # Applies a diff to the program. Each edit is a (start, end, new_lines) hunk that replaces
+  # lines[start:end] with new_lines, so (i, i+1, [s]) changes line i, (i, i, [s]) inserts s
+  # before line i and (i, j, []) deletes lines i through j-1.
+  # Line numbers refer to the program before any of the edits are applied. Every hunk is
+  # checked, tokenized and has its functions parsed before any line changes, so a bad edit
+  # leaves the Program untouched.
+  def apply_edits(self, edits):
+    hunks = sorted(((start, end, list(new_lines)) for start, end, new_lines in edits),
+                   key=lambda e: (e[0], e[1]), reverse=True)
+    next_start = None
+    for start, end, _ in hunks:
+      if start < 0 or end < start or end > len(self.lines):
+        raise Exception(f'Invalid edit of lines {start} to {end}')
+      if next_start is not None and (end > next_start or start == end == next_start):
+        raise Exception(f'Overlapping edit of lines {start} to {end}')
+      next_start = start
+    tokenized_hunks = [Tokenizer.tokenize_program(new_lines, start) for start, _, new_lines in hunks]
+    # hunks are applied bottom-up, so each hunk's new lines keep the line numbers they start at
+    hunk_functions = [self.func_manager.parse_functions(start, new_tokenized_lines)
+                      for (start, _, _), new_tokenized_lines in zip(hunks, tokenized_hunks)]
+    for (start, end, new_lines), new_tokenized_lines, new_functions in zip(hunks, tokenized_hunks, hunk_functions):
+      self._apply_edit(start, end, new_lines, new_tokenized_lines, new_functions)
+
+  # validates block structure using the cached first tokens and indentation; this still walks
+  # every line, but skips re-reading the source
+  def validate(self, interpreter):
+    interpreter.validate_structure(self.first_tokens, self.indents)
+
+  def _apply_edit(self, start, end, new_lines, new_tokenized_lines, new_functions):
+    self.lines[start:end] = new_lines
+    self.indents[start:end] = [InterpreterBase.indentation(line) for line in new_lines]
+    self.first_tokens[start:end] = [InterpreterBase.first_token(line) for line in new_lines]
+    self.tokenized_program[start:end] = new_tokenized_lines
+    self.func_manager.apply_edit(start, end, len(new_lines), new_functions)
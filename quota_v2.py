@@ -0,0 +1,22 @@
+# Quotas limits the resources a brewin program may use; a limit of None means unlimited.
+#   max_steps:        lines executed (including blank lines and block ends)
+#   max_call_depth:   functions (and lambdas) active at once, including main
+#   max_string_bytes: total utf-8 bytes of all strings a program builds with + or reads with input
+#   max_output_bytes: total utf-8 bytes of everything the program prints, one byte per newline
+#
+# Steps are charged once per basic block, when control jumps to another line, rather than once
+# per line, so a run may overshoot max_steps by at most the length of one block before stopping.
+class Quotas:
+  def __init__(self, max_steps=None, max_call_depth=None, max_string_bytes=None, max_output_bytes=None):
+    self.max_steps = max_steps
+    self.max_call_depth = max_call_depth
+    self.max_string_bytes = max_string_bytes
+    self.max_output_bytes = max_output_bytes
+
+# Raised when a program exceeds one of its quotas; the interpreter's error type is set to
+# ErrorType.RESOURCE_ERROR as for any other error
+class QuotaError(Exception):
+  def __init__(self, message, quota, line_num):
+    super().__init__(message)
+    self.quota = quota        # name of the Quotas attribute that was exceeded
+    self.line_num = line_num
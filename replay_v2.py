@@ -0,0 +1,231 @@
+import argparse
+import sys
+from interpreterv2 import Interpreter
+
+# Deterministic record/replay of brewin runs.
+#
+# A Recorder passed to Interpreter(journal=...) writes a compact binary log of one run: the
+# program, every input it consumed, the first line of every function it entered, every if/while
+# decision and, optionally, a checkpoint (step count and line) at the end of the first basic
+# block past every checkpoint_interval steps.
+# A Replayer re-runs the program from that log with no live input and raises ReplayDivergence
+# as soon as the run stops matching the recording, so a slow run can be profiled and bisected
+# offline, e.g.:
+#   python replay_v2.py record prog.brewin run.log input1 input2
+#   python -m cProfile replay_v2.py replay run.log
+#
+# Log format: MAGIC, a version byte, varint checkpoint interval (0 for none), varint number of
+# program lines and each line as a varint length and utf-8 text, then one record per event.
+# Each record is a tag byte followed by its varint/string payload; branch records are a single
+# byte. Lines are stored separately so lines that contain newlines survive the round trip.
+
+MAGIC = b'BRWN'
+VERSION = 2
+
+BRANCH_FALSE = 0
+BRANCH_TRUE = 1
+CALL = 2        # varint start ip
+INPUT = 3       # varint length, utf-8 bytes
+INPUT_NONE = 4  # input list exhausted
+CHECKPOINT = 5  # varint steps, varint ip
+
+EVENT_NAMES = {BRANCH_FALSE: 'branch False', BRANCH_TRUE: 'branch True', CALL: 'function call',
+               INPUT: 'input', INPUT_NONE: 'input', CHECKPOINT: 'checkpoint'}
+
+FLUSH_SIZE = 1 << 16
+
+class ReplayDivergence(Exception):
+  pass
+
+def _write_varint(buf, n):
+  while n >= 0x80:
+    buf.append((n & 0x7f) | 0x80)
+    n >>= 7
+  buf.append(n)
+
+def _write_string(buf, s):
+  data = s.encode()
+  _write_varint(buf, len(data))
+  buf += data
+
+class Recorder:
+  def __init__(self, path, checkpoint_interval=None):
+    self.path = path
+    self.checkpoint_interval = checkpoint_interval
+    self.file = None
+    self.buf = bytearray()
+
+  def start(self, program):
+    self.file = open(self.path, 'wb')
+    self.buf = bytearray(MAGIC)
+    self.buf.append(VERSION)
+    _write_varint(self.buf, self.checkpoint_interval or 0)
+    _write_varint(self.buf, len(program))
+    for line in program:
+      _write_string(self.buf, line)
+
+  def read_input(self, get_input):
+    value = get_input()
+    if value is None:
+      self.buf.append(INPUT_NONE)
+    else:
+      self.buf.append(INPUT)
+      _write_string(self.buf, value)
+    return value
+
+  def call(self, ip):
+    self.buf.append(CALL)
+    _write_varint(self.buf, ip)
+    if len(self.buf) >= FLUSH_SIZE:
+      self._flush()
+
+  def branch(self, taken):
+    self.buf.append(BRANCH_TRUE if taken else BRANCH_FALSE)
+    if len(self.buf) >= FLUSH_SIZE:
+      self._flush()
+
+  def checkpoint(self, steps, ip):
+    self.buf.append(CHECKPOINT)
+    _write_varint(self.buf, steps)
+    _write_varint(self.buf, ip)
+
+  def finish(self):
+    if self.file:
+      self._flush()
+      self.file.close()
+      self.file = None
+
+  def _flush(self):
+    self.file.write(self.buf)
+    self.buf = bytearray()
+
+class Replayer:
+  def __init__(self, path):
+    with open(path, 'rb') as f:
+      self.data = f.read()
+    self.pos = 0
+    if self.data[:len(MAGIC)] != MAGIC:
+      raise Exception(f'{path} is not a brewin replay log')
+    self.pos = len(MAGIC)
+    version = self._read_byte()
+    if version != VERSION:
+      raise Exception(f'Unsupported replay log version {version}')
+    self.checkpoint_interval = self._read_varint() or None
+    self.program = [self._read_string() for _ in range(self._read_varint())]
+    self.events_start = self.pos
+
+  def start(self, program):
+    if list(program) != self.program:
+      raise ReplayDivergence('Program does not match the recorded program')
+    self.pos = self.events_start
+
+  def read_input(self, get_input):
+    tag = self._read_tag('input')
+    if tag == INPUT_NONE:
+      return None
+    if tag != INPUT:
+      self._diverged('input', tag)
+    return self._read_string()
+
+  def call(self, ip):
+    tag = self._read_tag('function call')
+    if tag != CALL:
+      self._diverged('function call', tag)
+    recorded = self._read_varint()
+    if recorded != ip:
+      raise ReplayDivergence(f'Entered function at line {ip}, recording entered line {recorded}')
+
+  def branch(self, taken):
+    tag = self._read_tag('branch')
+    if tag != (BRANCH_TRUE if taken else BRANCH_FALSE):
+      self._diverged(f'branch {taken}', tag)
+
+  def checkpoint(self, steps, ip):
+    tag = self._read_tag('checkpoint')
+    if tag != CHECKPOINT:
+      self._diverged('checkpoint', tag)
+    recorded_steps = self._read_varint()
+    recorded_ip = self._read_varint()
+    if (recorded_steps, recorded_ip) != (steps, ip):
+      raise ReplayDivergence(f'At step {steps} on line {ip}, recording was on line {recorded_ip}')
+
+  def finish(self):
+    pass
+
+  # true once every recorded event has been replayed
+  def at_end(self):
+    return self.pos == len(self.data)
+
+  def _diverged(self, event, tag):
+    recorded = EVENT_NAMES.get(tag, f'unknown event {tag}')
+    raise ReplayDivergence(f'Run reached {event} where the recording has {recorded} (offset {self.pos - 1})')
+
+  def _read_tag(self, event):
+    if self.pos >= len(self.data):
+      raise ReplayDivergence(f'Run reached {event} after the end of the recording')
+    return self._read_byte()
+
+  def _read_byte(self):
+    if self.pos >= len(self.data):
+      raise Exception('Truncated replay log')
+    b = self.data[self.pos]
+    self.pos += 1
+    return b
+
+  def _read_varint(self):
+    n = 0
+    shift = 0
+    while True:
+      b = self._read_byte()
+      n |= (b & 0x7f) << shift
+      if b < 0x80:
+        return n
+      shift += 7
+
+  def _read_string(self):
+    length = self._read_varint()
+    if self.pos + length > len(self.data):
+      raise Exception('Truncated replay log')
+    s = self.data[self.pos:self.pos + length].decode()
+    self.pos += length
+    return s
+
+# runs program while recording it to log_path and returns the interpreter
+def record(program, log_path, input=None, checkpoint_interval=None, **kwargs):
+  interpreter = Interpreter(input=input, journal=Recorder(log_path, checkpoint_interval), **kwargs)
+  interpreter.run(program)
+  return interpreter
+
+# re-runs the program recorded in log_path and returns the interpreter
+def replay(log_path, **kwargs):
+  replayer = Replayer(log_path)
+  interpreter = Interpreter(journal=replayer, **kwargs)
+  interpreter.run(replayer.program)
+  if not replayer.at_end():
+    raise ReplayDivergence('Run finished before the end of the recording')
+  return interpreter
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Record and replay brewin runs')
+  commands = parser.add_subparsers(dest='command', required=True)
+  rec = commands.add_parser('record', help='run a program and record it')
+  rec.add_argument('--checkpoint', type=int, help='record a checkpoint every N steps')
+  rec.add_argument('program')
+  rec.add_argument('log')
+  rec.add_argument('input', nargs='*', help='input lines, read from stdin if none are given')
+  rep = commands.add_parser('replay', help='re-run a recorded program')
+  rep.add_argument('--trace', action='store_true')
+  rep.add_argument('--quiet', action='store_true', help="don't print the program's output")
+  rep.add_argument('log')
+  args = parser.parse_args(argv)
+
+  if args.command == 'record':
+    with open(args.program) as f:
+      program = f.read().split('\n')
+    record(program, args.log, args.input, args.checkpoint)
+  else:
+    replay(args.log, console_output=not args.quiet, trace_output=args.trace)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from collections import OrderedDict
+from interpreterv2 import Interpreter
+from program_v2 import Program
+from quota_v2 import Quotas
+
+# A long-lived local server that keeps the interpreter loaded and runs brewin programs sent to it
+# over a Unix domain socket, so short runs don't pay for python startup and imports.
+#
+# Protocol: the client connects, sends one JSON request and shuts down its side of the socket:
+#   {"program": [lines] or "source text", "input": [strings], "max_steps": n, "max_call_depth": n,
+#    "max_string_bytes": n, "max_output_bytes": n}
+# and the server replies with one JSON response and closes the connection:
+#   {"output": [strings], "error_type": "TYPE_ERROR" or null, "error_line": n or null,
+#    "error": message or null}
+#
+# The parent process binds the socket and pre-forks a pool of workers that all accept on it.
+# A request's quotas (see quota_v2.py) can only tighten the server's own limits.
+# A client that doesn't finish sending its request within the timeout, or sends more than
+# MAX_REQUEST_BYTES, gets an error response so it can't hold a worker indefinitely.
+# Each worker keeps a cache of analyzed programs (see program_v2.py) keyed by source text, and
+# programs passed with --preload are analyzed before forking so every worker shares them.
+
+DEFAULT_WORKERS = 4
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_TIMEOUT = 5.0  # seconds a client has to send its whole request
+MAX_REQUEST_BYTES = 1 << 22
+DEFAULT_QUOTAS = Quotas(max_steps=1000000, max_call_depth=1000, max_string_bytes=1 << 26,
+                        max_output_bytes=1 << 20)
+QUOTA_NAMES = ['max_steps', 'max_call_depth', 'max_string_bytes', 'max_output_bytes']
+
+# LRU cache of analyzed programs, keyed by program source
+class ProgramCache:
+  def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+    self.max_size = max_size
+    self.programs = OrderedDict()
+
+  def get(self, lines):
+    key = '\n'.join(lines)
+    program = self.programs.get(key)
+    if program is not None:
+      self.programs.move_to_end(key)
+      return program
+    program = Program(lines)
+    self.programs[key] = program
+    if len(self.programs) > self.max_size:
+      self.programs.popitem(last=False)
+    return program
+
+class Server:
+  def __init__(self, socket_path, workers=DEFAULT_WORKERS, cache_size=DEFAULT_CACHE_SIZE,
+               quotas=DEFAULT_QUOTAS, timeout=DEFAULT_TIMEOUT):
+    self.socket_path = socket_path
+    self.num_workers = workers
+    self.timeout = timeout
+    self.quotas = quotas
+    self.cache = ProgramCache(cache_size)
+    self.workers = set()
+    self.stopping = False
+
+  # analyze programs in the parent so that forked workers share them
+  def preload(self, programs):
+    for lines in programs:
+      self.cache.get(lines)
+
+  def serve_forever(self):
+    if os.path.exists(self.socket_path):
+      os.unlink(self.socket_path)
+    self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    self.listener.bind(self.socket_path)
+    self.listener.listen(128)
+    signal.signal(signal.SIGTERM, self._stop)
+    signal.signal(signal.SIGINT, self._stop)
+    try:
+      for _ in range(self.num_workers):
+        self._spawn_worker()
+      # respawn workers that die until we are told to stop
+      while not self.stopping:
+        try:
+          pid, _ = os.wait()
+        except InterruptedError:
+          continue
+        except ChildProcessError:
+          break
+        self.workers.discard(pid)
+        if not self.stopping:
+          self._spawn_worker()
+    finally:
+      for pid in self.workers:
+        try:
+          os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+          pass
+      self.listener.close()
+      if os.path.exists(self.socket_path):
+        os.unlink(self.socket_path)
+
+  # os.wait() is retried after a signal handler returns, so stop the workers to wake it up
+  def _stop(self, signum, frame):
+    self.stopping = True
+    for pid in self.workers:
+      try:
+        os.kill(pid, signal.SIGTERM)
+      except ProcessLookupError:
+        pass
+
+  def _spawn_worker(self):
+    pid = os.fork()
+    if pid:
+      self.workers.add(pid)
+      return
+    try:
+      signal.signal(signal.SIGTERM, signal.SIG_DFL)
+      signal.signal(signal.SIGINT, signal.SIG_IGN)
+      # programs must never block on the server's stdin
+      devnull = os.open(os.devnull, os.O_RDONLY)
+      os.dup2(devnull, 0)
+      self._worker_loop()
+    finally:
+      os._exit(0)
+
+  def _worker_loop(self):
+    interpreter = Interpreter(console_output=False)
+    while True:
+      conn, _ = self.listener.accept()
+      with conn:
+        try:
+          request = json.loads(_recv_all(conn, MAX_REQUEST_BYTES, self.timeout))
+          response = self.handle(interpreter, request)
+        except Exception as e:
+          response = {'output': [], 'error_type': None, 'error_line': None, 'error': f'Bad request: {e}'}
+        try:
+          conn.settimeout(self.timeout)  # reading may have left only a fraction of it
+          conn.sendall(json.dumps(response).encode())
+        except OSError:
+          pass
+
+  # runs a single request and returns the response
+  def handle(self, interpreter, request):
+    quotas = self._request_quotas(request)
+    program = self.cache.get(_program_lines(request['program']))
+    interpreter.reset()
+    interpreter.input = request.get('input')
+    interpreter.quotas = quotas
+    error = None
+    try:
+      interpreter.run(program)
+    except Exception as e:
+      error = str(e)
+    error_type, error_line = interpreter.get_error_type_and_line()
+    return {
+      'output': [str(v) for v in interpreter.get_output()],
+      'error_type': error_type.name if error_type else None,
+      'error_line': error_line,
+      'error': error,
+    }
+
+  def _request_quotas(self, request):
+    quotas = Quotas()
+    for name in QUOTA_NAMES:
+      limit = request.get(name)
+      if limit is not None and (type(limit) != int or limit <= 0):
+        raise Exception(f'{name} must be a positive integer')
+      limits = [v for v in (getattr(self.quotas, name), limit) if v is not None]
+      setattr(quotas, name, min(limits) if limits else None)
+    return quotas
+
+# sends a program to the server at socket_path and returns its response
+def run_remote(socket_path, program, input=None, **quotas):
+  request = {'program': _program_lines(program), 'input': input}
+  for name, limit in quotas.items():
+    if limit is not None:
+      request[name] = limit
+  with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+    conn.connect(socket_path)
+    conn.sendall(json.dumps(request).encode())
+    conn.shutdown(socket.SHUT_WR)
+    return json.loads(_recv_all(conn))
+
+# reads until the peer shuts down its side; timeout bounds the whole read, not each recv
+def _recv_all(conn, max_bytes = None, timeout = None):
+  deadline = time.monotonic() + timeout if timeout is not None else None
+  chunks = []
+  size = 0
+  while True:
+    if deadline is not None:
+      remaining = deadline - time.monotonic()
+      if remaining <= 0:
+        raise Exception(f'Request not received within {timeout} seconds')
+      conn.settimeout(remaining)
+    chunk = conn.recv(65536)
+    if not chunk:
+      return b''.join(chunks)
+    size += len(chunk)
+    if max_bytes is not None and size > max_bytes:
+      raise Exception(f'Request is larger than {max_bytes} bytes')
+    chunks.append(chunk)
+
+def _program_lines(program):
+  if isinstance(program, str):
+    return program.split('\n')
+  return list(program)
+
+def _read_program(path):
+  with open(path) as f:
+    return f.read().split('\n')
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Warm-start brewin interpreter server')
+  commands = parser.add_subparsers(dest='command', required=True)
+  serve = commands.add_parser('serve', help='start the server')
+  serve.add_argument('--socket', required=True)
+  serve.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+  serve.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE)
+  serve.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='seconds to wait on a client')
+  for name in QUOTA_NAMES:
+    serve.add_argument('--' + name.replace('_', '-'), type=int, default=getattr(DEFAULT_QUOTAS, name))
+  serve.add_argument('--preload', nargs='*', default=[], help='programs to analyze before forking')
+  run = commands.add_parser('run', help='run a program on a running server')
+  run.add_argument('--socket', required=True)
+  for name in QUOTA_NAMES:
+    run.add_argument('--' + name.replace('_', '-'), type=int)
+  run.add_argument('program')
+  run.add_argument('input', nargs='*')
+  args = parser.parse_args(argv)
+
+  if args.command == 'serve':
+    quotas = Quotas(**{name: getattr(args, name) for name in QUOTA_NAMES})
+    server = Server(args.socket, args.workers, args.cache_size, quotas, args.timeout)
+    server.preload(_read_program(path) for path in args.preload)
+    server.serve_forever()
+    return 0
+
+  quotas = {name: getattr(args, name) for name in QUOTA_NAMES}
+  response = run_remote(args.socket, _read_program(args.program), args.input, **quotas)
+  for line in response['output']:
+    print(line)
+  if response['error']:
+    print(response['error'], file=sys.stderr)
+    return 1
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
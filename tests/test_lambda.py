@@ -0,0 +1,149 @@
+import pytest
+from intbase import ErrorType
+from interpreterv2 import Interpreter
+
+def run(lines):
+  interpreter = Interpreter(console_output=False)
+  interpreter.run(lines)
+  return interpreter.get_output()
+
+def test_captures_values_at_creation():
+  lines = [
+    'func main void',
+    '  var int a',
+    '  assign a 10',
+    '  lambda x:int int',
+    '    return + x a',
+    '  endlambda',
+    '  assign a 0',
+    '  funccall resultf 5',
+    '  funccall print resulti a',
+    'endfunc',
+  ]
+  assert run(lines) == ['150']
+
+def test_captures_only_names_used_in_body():
+  lines = [
+    'func main void',
+    '  var int a b',
+    '  lambda x:int int',
+    '    var int b',
+    '    return + x a',
+    '  endlambda',
+    'endfunc',
+  ]
+  interpreter = Interpreter(console_output=False)
+  interpreter.run(lines)
+  info = interpreter.func_manager.get_lambda_info(2, interpreter.tokenized_program, interpreter.indents)
+  # b is also captured because the body names it; the body's own var b shadows it
+  assert info.free_vars == ('b', 'a')
+  assert info.end_ip == 5
+
+def test_assignment_to_capture_does_not_persist():
+  lines = [
+    'func main void',
+    '  var int n',
+    '  var func f',
+    '  lambda void',
+    '    assign n + n 1',
+    '    funccall print n',
+    '  endlambda',
+    '  assign f resultf',
+    '  funccall f',
+    '  funccall f',
+    '  funccall print n',
+    'endfunc',
+  ]
+  assert run(lines) == ['1', '1', '0']
+
+def test_nested_lambda_returned_from_function():
+  lines = [
+    'func main void',
+    '  funccall make 3',
+    '  funccall resultf 4',
+    '  funccall print resulti',
+    'endfunc',
+    'func make n:int func',
+    '  lambda x:int int',
+    '    lambda z:int int',
+    '      return * z n',
+    '    endlambda',
+    '    funccall resultf x',
+    '    return + resulti 1',
+    '  endlambda',
+    '  return resultf',
+    'endfunc',
+  ]
+  assert run(lines) == ['13']
+
+def test_function_values_and_ref_params():
+  lines = [
+    'func main void',
+    '  var int i',
+    '  var func g',
+    '  assign g twice',
+    '  funccall apply g 21',
+    '  funccall print resulti',
+    '  lambda y:refint void',
+    '    assign y 7',
+    '  endlambda',
+    '  funccall resultf i',
+    '  funccall print i',
+    'endfunc',
+    'func twice x:int int',
+    '  return * x 2',
+    'endfunc',
+    'func apply h:func v:int int',
+    '  funccall h v',
+    '  return resulti',
+    'endfunc',
+  ]
+  assert run(lines) == ['42', '7']
+
+def test_calling_unassigned_func_variable():
+  interpreter = Interpreter(console_output=False)
+  with pytest.raises(Exception):
+    interpreter.run(['func main void', '  var func f', '  funccall f', 'endfunc'])
+  assert interpreter.get_error_type_and_line() == (ErrorType.NAME_ERROR, 2)
+
+def test_validate_lambda_blocks():
+  interpreter = Interpreter(console_output=False)
+  interpreter.validate_program(['func main void', '  lambda void', '  endlambda', 'endfunc'])
+  with pytest.raises(Exception):
+    interpreter.validate_program(['func main void', '  lambda void', 'endfunc'])
+
+def test_lambda_cache_follows_edits():
+  from program_v2 import Program
+  lines = [
+    'func main void',
+    '  var int a',
+    '  lambda x:int int',
+    '    return + x a',
+    '  endlambda',
+    '  funccall resultf 1',
+    '  funccall print resulti',
+    'endfunc',
+  ]
+  program = Program(lines)
+  assert run(program) == ['1']
+  cached = program.func_manager.lambda_cache[2]
+  program.apply_edits([(1, 1, ['  var int b']), (6, 7, ['  funccall print resulti b'])])
+  # an edit above the lambda shifts its cached analysis, one below it keeps it
+  assert program.func_manager.lambda_cache[3] is cached
+  assert (cached.start_ip, cached.end_ip) == (4, 5)
+  assert run(program) == ['10']
+  program.apply_edits([(4, 5, ['    return + x b'])])
+  # an edit inside the lambda drops it so it is re-analyzed
+  assert 3 not in program.func_manager.lambda_cache
+  assert run(program) == ['10']
+  assert program.func_manager.lambda_cache[3].free_vars == ('b',)
+
+@pytest.mark.parametrize('arg', ['f', 'twice'])
+def test_printing_func_value_is_type_error(arg):
+  interpreter = Interpreter(console_output=False)
+  lines = ['func main void', '  var func f', f'  funccall print "f is " {arg}', 'endfunc',
+           'func twice x:int int', '  return * x 2', 'endfunc']
+  with pytest.raises(Exception):
+    interpreter.run(lines)
+  assert interpreter.get_error_type_and_line() == (ErrorType.TYPE_ERROR, 2)
+  assert interpreter.get_output() == []
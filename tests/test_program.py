@@ -0,0 +1,99 @@
+import random
+import pytest
+from interpreterv2 import Interpreter
+from program_v2 import Program
+
+PROGRAM = [
+  'func main void',
+  '  var int x',
+  '  assign x 3',
+  '  while > x 0',
+  '    funccall foo x',
+  '    funccall print resulti',
+  '    assign x - x 1',
+  '  endwhile',
+  'endfunc',
+  'func foo a:int int',
+  '  return * a 2',
+  'endfunc',
+]
+
+def snapshot(program):
+  funcs = {name: (info.start_ip, info.args, info.return_type, info.refs)
+           for name, info in program.func_manager.func_cache.items()}
+  return (program.lines, program.indents, program.first_tokens, program.tokenized_program, funcs)
+
+def run(program):
+  interpreter = Interpreter(console_output=False)
+  interpreter.run(program)
+  return interpreter.get_output()
+
+def test_edit_matches_fresh_analysis():
+  program = Program(PROGRAM)
+  program.apply_edits([(2, 3, ['  assign x 2']), (10, 11, ['  return * a 10'])])
+  expected = list(PROGRAM)
+  expected[2] = '  assign x 2'
+  expected[10] = '  return * a 10'
+  assert snapshot(program) == snapshot(Program(expected))
+  assert run(program) == ['20', '10']
+
+def test_random_edits_match_fresh_analysis():
+  pool = ['func bar void', 'endfunc', '  funccall print "a # b"', '', 'func foo x:refint int',
+          '  return 3', 'func main void']
+  rng = random.Random(131)
+  program = Program(PROGRAM)
+  lines = list(PROGRAM)
+  for _ in range(500):
+    edits = []
+    limit = len(lines)
+    while limit >= 0 and len(edits) < 3:
+      end = rng.randint(0, limit)
+      start = rng.randint(0, end)
+      edits.append((start, end, [rng.choice(pool) for _ in range(rng.randint(0, 2))]))
+      limit = start - 1
+    program.apply_edits(edits)
+    for start, end, new_lines in sorted(edits, key=lambda e: (e[0], e[1]), reverse=True):
+      lines[start:end] = new_lines
+    assert snapshot(program) == snapshot(Program(lines))
+
+def test_function_defined_twice_last_wins_after_delete():
+  lines = PROGRAM + ['func foo a:int int', '  return a', 'endfunc']
+  program = Program(lines)
+  assert run(program) == ['3', '2', '1']
+  program.apply_edits([(12, 15, [])])
+  assert snapshot(program) == snapshot(Program(PROGRAM))
+  assert run(program) == ['6', '4', '2']
+
+@pytest.mark.parametrize('edits', [
+  [(1, 2, ['  var int y']), (-1, 0, ['x'])],
+  [(1, 2, ['  var int y']), (5, 20, [])],
+  [(1, 3, ['  var int y']), (2, 4, [])],
+  [(1, 2, ['  var int y']), (5, 6, ['    funccall print "oops'])],
+  [(1, 2, ['  var int y']), (9, 10, ['func bar x int'])],
+])
+def test_bad_edit_leaves_program_unchanged(edits):
+  program = Program(PROGRAM)
+  before = snapshot(program)
+  with pytest.raises(Exception):
+    program.apply_edits(edits)
+  assert snapshot(program) == before
+
+def validation_error(validate):
+  try:
+    validate()
+  except Exception as e:
+    return str(e)
+  return None
+
+@pytest.mark.parametrize('edits', [
+  [(2, 3, ['  assign x 2'])],
+  [(3, 3, ['  if True', '    funccall print x', '  endif'])],
+  [(7, 8, [])],
+  [(5, 6, ['  funccall print resulti'])],
+  [(11, 12, ['endwhile'])],
+])
+def test_validate_after_edit_matches_validate_program(edits):
+  program = Program(PROGRAM)
+  program.apply_edits(edits)
+  expected = validation_error(lambda: Interpreter(console_output=False).validate_program(program.lines))
+  assert validation_error(lambda: program.validate(Interpreter(console_output=False))) == expected
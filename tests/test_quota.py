@@ -0,0 +1,69 @@
+import pytest
+from intbase import ErrorType
+from interpreterv2 import Interpreter
+from quota_v2 import Quotas, QuotaError
+
+def run(lines, input=None, **quotas):
+  interpreter = Interpreter(console_output=False, input=input, quotas=Quotas(**quotas))
+  interpreter.run(lines)
+  return interpreter
+
+def quota_error(lines, input=None, **quotas):
+  interpreter = Interpreter(console_output=False, input=input, quotas=Quotas(**quotas))
+  with pytest.raises(QuotaError) as e:
+    interpreter.run(lines)
+  assert interpreter.get_error_type_and_line() == (ErrorType.RESOURCE_ERROR, e.value.line_num)
+  return e.value
+
+COUNT = [
+  'func main void',
+  '  var int i',
+  '  while < i 10',
+  '    assign i + i 1',
+  '  endwhile',
+  'endfunc',
+]
+
+def test_steps_counted_per_line():
+  # var, 3 lines for each of 10 iterations, the final test and endfunc
+  assert run(COUNT).steps == 1 + 3 * 10 + 2
+
+def test_step_limit():
+  error = quota_error(['func main void', '  while True', '  endwhile', 'endfunc'], max_steps=1000)
+  assert (error.quota, error.line_num) == ('max_steps', 2)
+
+def test_call_depth_limit():
+  lines = ['func main void', '  funccall f', 'endfunc', 'func f void', '  funccall f', 'endfunc']
+  error = quota_error(lines, max_call_depth=50)
+  assert (error.quota, error.line_num) == ('max_call_depth', 4)
+
+def test_string_bytes_are_cumulative():
+  lines = [
+    'func main void',
+    '  var string s',
+    '  var int i',
+    '  while < i 100',
+    '    assign s + "abcdefghij" ""',
+    '    assign i + i 1',
+    '  endwhile',
+    'endfunc',
+  ]
+  # no string is longer than 10 bytes, but 100 of them are built
+  assert run(lines, max_string_bytes=1000).steps > 0
+  error = quota_error(lines, max_string_bytes=999)
+  assert (error.quota, error.line_num) == ('max_string_bytes', 4)
+
+def test_string_bytes_count_utf8():
+  lines = ['func main void', '  var string s', '  assign s + "éé" ""', 'endfunc']
+  run(lines, max_string_bytes=4)
+  assert quota_error(lines, max_string_bytes=3).quota == 'max_string_bytes'
+
+def test_input_is_charged():
+  lines = ['func main void', '  funccall input', 'endfunc']
+  run(lines, input=['x' * 10], max_string_bytes=10)
+  assert quota_error(lines, input=['x' * 11], max_string_bytes=10).line_num == 1
+
+def test_output_limit():
+  lines = ['func main void', '  while True', '    funccall print "hello"', '  endwhile', 'endfunc']
+  error = quota_error(lines, max_output_bytes=100)
+  assert (error.quota, error.line_num) == ('max_output_bytes', 2)
@@ -0,0 +1,73 @@
+import pytest
+from interpreterv2 import Interpreter
+from replay_v2 import CALL, Replayer, ReplayDivergence, record, replay
+
+PROGRAM = [
+  'func main void',
+  '  var int n i',
+  '  funccall input "n?"',
+  '  funccall strtoint results',
+  '  assign n resulti',
+  '  while < i n',
+  '    if == % i 2 0',
+  '      funccall print i',
+  '    endif',
+  '    assign i + i 1',
+  '  endwhile',
+  '  funccall input',
+  '  funccall print "last " results',
+  'endfunc',
+]
+
+def test_round_trip_without_live_input(tmp_path):
+  log = str(tmp_path / 'run.log')
+  recorded = record(PROGRAM, log, input=['5', 'tail'], checkpoint_interval=7, console_output=False)
+  replayed = replay(log, console_output=False)
+  assert replayed.get_output() == recorded.get_output() == ['n?', '0', '2', '4', 'last tail']
+  assert replayed.steps == recorded.steps
+
+def test_exhausted_input_is_replayed(tmp_path):
+  log = str(tmp_path / 'run.log')
+  record(PROGRAM, log, input=['1'], console_output=False)
+  assert replay(log, console_output=False).get_output()[-1] == 'last None'
+
+def test_changed_branch_diverges(tmp_path):
+  log = str(tmp_path / 'run.log')
+  record(PROGRAM, log, input=['5', 'tail'], console_output=False)
+  replayer = Replayer(log)
+  changed = list(PROGRAM)
+  changed[6] = '    if == % i 2 1'
+  replayer.program = changed
+  with pytest.raises(ReplayDivergence, match='branch'):
+    Interpreter(console_output=False, journal=replayer).run(changed)
+
+def test_different_program_is_rejected(tmp_path):
+  log = str(tmp_path / 'run.log')
+  record(PROGRAM, log, input=['5', 'tail'], console_output=False)
+  with pytest.raises(ReplayDivergence, match='Program'):
+    Interpreter(console_output=False, journal=Replayer(log)).run(PROGRAM[:-1])
+
+def test_newline_terminated_lines_round_trip(tmp_path):
+  log = str(tmp_path / 'run.log')
+  lines = ['func main void\n', '  funccall foo\n', 'endfunc\n', 'func foo void\n',
+           '  funccall print "foo"\n', 'endfunc\n']
+  record(lines, log, console_output=False)
+  assert Replayer(log).program == lines
+  assert replay(log, console_output=False).get_output() == ['foo']
+
+@pytest.mark.parametrize('keep', [6, 12, 20])
+def test_truncated_log(tmp_path, keep):
+  log = tmp_path / 'run.log'
+  record(PROGRAM, str(log), input=['5', 'tail'], console_output=False)
+  log.write_bytes(log.read_bytes()[:keep])
+  with pytest.raises(Exception, match='Truncated replay log'):
+    replay(str(log), console_output=False)
+
+def test_truncated_varint_in_events(tmp_path):
+  log = tmp_path / 'run.log'
+  record(PROGRAM, str(log), input=['5', 'tail'], console_output=False)
+  header = log.read_bytes()[:Replayer(str(log)).events_start]
+  # the call into main, cut off inside its varint
+  log.write_bytes(header + bytes([CALL, 0x80]))
+  with pytest.raises(Exception, match='Truncated replay log'):
+    replay(str(log), console_output=False)
@@ -0,0 +1,101 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+import pytest
+from interpreterv2 import Interpreter
+from server_v2 import Server, run_remote
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HELLO = ['func main void', '  funccall print "hello"', 'endfunc']
+LOOP = ['func main void', '  while True', '  endwhile', 'endfunc']
+
+def handle(request, interpreter=None):
+  return Server('unused').handle(interpreter or Interpreter(console_output=False), request)
+
+def test_handle_runs_program():
+  response = handle({'program': HELLO})
+  assert response == {'output': ['hello'], 'error_type': None, 'error_line': None, 'error': None}
+
+def test_step_limit():
+  response = handle({'program': LOOP, 'max_steps': 100})
+  assert response['error_type'] == 'RESOURCE_ERROR'
+  assert response['error_line'] == 2
+
+def test_error_line_not_carried_over_between_requests():
+  interpreter = Interpreter(console_output=False)
+  handle({'program': ['func main void', '  var int x', '  assign x True', 'endfunc']}, interpreter)
+  response = handle({'program': ['func foo void'], 'max_steps': 10}, interpreter)
+  assert response['error_type'] == 'NAME_ERROR'
+  assert response['error_line'] is None
+
+@pytest.mark.parametrize('limit', [0, -1, 1.5, '10', True])
+def test_rejects_bad_quotas(limit):
+  with pytest.raises(Exception, match='positive integer'):
+    handle({'program': HELLO, 'max_steps': limit})
+
+@pytest.fixture
+def server(tmp_path):
+  path = str(tmp_path / 'brewin.sock')
+  proc = subprocess.Popen([sys.executable, 'server_v2.py', 'serve', '--socket', path,
+                           '--workers', '2', '--timeout', '0.5'], cwd=REPO)
+  deadline = time.time() + 10
+  while not os.path.exists(path):
+    assert time.time() < deadline, 'server did not start'
+    time.sleep(0.05)
+  yield path
+  proc.terminate()
+  proc.wait(10)
+  assert not os.path.exists(path)
+
+def test_idle_clients_do_not_block_pool(server):
+  idle = []
+  for _ in range(2):
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.connect(server)
+    idle.append(conn)
+  try:
+    start = time.time()
+    response = run_remote(server, HELLO)
+    assert response['output'] == ['hello']
+    assert time.time() - start < 5
+  finally:
+    for conn in idle:
+      conn.close()
+
+def test_oversized_request_is_rejected(server):
+  # the server may close the connection before the client has finished sending
+  try:
+    response = run_remote(server, HELLO + ['# ' + 'x' * (5 << 20)])
+    assert response['error'].startswith('Bad request')
+  except (BrokenPipeError, ConnectionResetError):
+    pass
+  assert run_remote(server, HELLO)['output'] == ['hello']
+
+def test_trickling_client_is_cut_off(server):
+  # a byte every 0.2s never trips a per-recv timeout of 0.5s, but the whole request must
+  # arrive within 0.5s
+  conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  conn.connect(server)
+  conn.settimeout(0.2)
+  start = time.time()
+  response = b''
+  try:
+    while time.time() - start < 5:
+      try:
+        conn.sendall(b' ')
+      except OSError:
+        pass
+      try:
+        chunk = conn.recv(65536)
+      except socket.timeout:
+        continue
+      if not chunk:
+        break
+      response += chunk
+  finally:
+    conn.close()
+  assert b'Bad request' in response
+  assert time.time() - start < 2
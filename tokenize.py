@@ -5,9 +5,10 @@ from intbase import InterpreterBase, ErrorType
 # Output: A list of lists of tokens, e.g.: [["func","main"],["assign","x","10"],["funccall","print","x"],["endfunc"]]
 class Tokenizer:
   # Performs tokenization and returns the tokenized program
-  def tokenize_program(program):
+  # first_line is the line number of program[0], used when tokenizing a slice of a larger program
+  def tokenize_program(program, first_line = 0):
     tokenized_program = []
-    for line_num, line in enumerate(program):
+    for line_num, line in enumerate(program, first_line):
       tokens = Tokenizer._tokenize(line_num, line.rstrip())
       tokenized_program.append(tokens)
     return tokenized_program